@@ -9,57 +9,69 @@ Usage (from OpenWrt source root):
     python3 resolve-extra-downloads.py /tmp/resolved_deps.txt tmp/.packageinfo
 """
 
+import mmap
+import os
 import re
 import sys
 
+# One .packageinfo block: its Source-Makefile line, then the lines up to the
+# first non-empty Source: line without crossing into the next block.
+SOURCE_STANZA_RE = re.compile(
+    rb"^Source-Makefile: package/(.+)/Makefile\n"
+    rb"(?:(?!Source-Makefile: )[^\n]*\n)*?"
+    rb"Source: \S",
+    re.MULTILINE,
+)
+
 
 def parse_deps(deps_path):
     """Parse DEPS:/SELECTED: lines from Make dump."""
-    compile_deps = {}  # src_dir -> set of dep src_dirs
+    compile_deps = {}  # src_dir -> list of dep src_dirs
     selected = set()
 
-    with open(deps_path) as f:
+    with open(deps_path, buffering=1 << 20) as f:
         for line in f:
-            line = line.strip()
-            if line.startswith("SELECTED:"):
-                selected.add(line[9:])
-            elif line.startswith("DEPS:"):
-                parts = line[5:].split(":", 1)
-                if len(parts) == 2:
-                    compile_deps[parts[0]] = set(parts[1].split())
+            tag, _, rest = line.partition(":")
+            if tag == "SELECTED":
+                selected.add(rest.rstrip())
+            elif tag == "DEPS":
+                key, sep, deps = rest.partition(":")
+                if sep:
+                    compile_deps[key] = deps.split()
 
     return compile_deps, selected
 
 
 def bfs_closure(selected, compile_deps):
-    """Compute transitive closure of compile dependencies via BFS."""
-    closure = set()
-    queue = list(selected)
-    while queue:
-        node = queue.pop()
-        if node in closure:
-            continue
-        closure.add(node)
-        for dep in compile_deps.get(node, set()):
+    """Compute transitive closure of compile dependencies via DFS."""
+    closure = set(selected)
+    # Seeds are already in the closure; start from their unseen deps
+    stack = []
+    for node in selected:
+        for dep in compile_deps.get(node, ()):
+            if dep not in closure:
+                closure.add(dep)
+                stack.append(dep)
+    while stack:
+        node = stack.pop()
+        for dep in compile_deps.get(node, ()):
             if dep not in closure:
-                queue.append(dep)
+                closure.add(dep)
+                stack.append(dep)
     return closure
 
 
 def packages_with_source(packageinfo_path):
     """Find packages that have downloadable source tarballs."""
     has_source = set()
-    cur = None
 
-    with open(packageinfo_path) as f:
-        for line in f:
-            m = re.match(r"Source-Makefile: package/(.+)/Makefile", line)
-            if m:
-                cur = m.group(1)
-                continue
-            m = re.match(r"Source: (\S+)", line)
-            if m and cur:
-                has_source.add(cur)
+    with open(packageinfo_path, "rb") as f:
+        # mmap refuses zero-length files
+        if os.fstat(f.fileno()).st_size == 0:
+            return has_source
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for m in SOURCE_STANZA_RE.finditer(mm):
+                has_source.add(m.group(1).decode())
 
     return has_source
 
@@ -73,13 +85,15 @@ def main():
     has_source = packages_with_source(pkginfo_path)
 
     # Only download extras (already-selected packages are handled by `make download`)
-    extra = closure - selected
-    for d in sorted(extra):
+    candidates = []
+    for d in closure - selected:
         # Host variants (e.g. "feeds/packages/libffi/host") share their
         # parent's source directory — map to the download target.
-        dl = d[:-5] if d.endswith("/host") else d
+        dl = d.removesuffix("/host")
         if dl in has_source:
-            print(dl)
+            candidates.append(dl)
+    if candidates:
+        sys.stdout.write("\n".join(sorted(candidates)) + "\n")
 
 
 if __name__ == "__main__":